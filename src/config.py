@@ -1,9 +1,44 @@
 from __future__ import annotations
 
+import functools
 import os
 from dataclasses import dataclass
+
+import httpx
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
+
+# Parse .env exactly once, at import time, so CLI tools “just work” and
+# repeat load_settings() calls never touch the filesystem again.
+load_dotenv(override=True)
+
+# One connection pool for the whole process: keep-alive (and HTTP/2
+# multiplexing) means only the first API call pays the TCP+TLS handshake.
+_http_client: httpx.Client | None = None
+_async_http_client: httpx.AsyncClient | None = None
+
+_POOL_LIMITS = httpx.Limits(
+    max_connections=100,
+    max_keepalive_connections=20,
+    keepalive_expiry=30.0,
+)
+_POOL_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+
+
+def _shared_http_client() -> httpx.Client:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.Client(http2=True, limits=_POOL_LIMITS, timeout=_POOL_TIMEOUT)
+    return _http_client
+
+
+def _shared_async_http_client() -> httpx.AsyncClient:
+    global _async_http_client
+    if _async_http_client is None:
+        _async_http_client = httpx.AsyncClient(
+            http2=True, limits=_POOL_LIMITS, timeout=_POOL_TIMEOUT
+        )
+    return _async_http_client
 
 
 @dataclass(frozen=True)
@@ -12,12 +47,21 @@ class Settings:
     model_default: str
     model_fast: str
     model_tiny: str
+    # When a lone successful math tool call is clearly the whole answer,
+    # return it directly instead of paying for a second LLM round-trip.
+    skip_second_pass_for_simple_math: bool = False
+    # Ceiling on generated answer length; output tokens dominate generation
+    # time, so this bounds worst-case latency.
+    max_answer_tokens: int = 512
+    # Optional sampling seed: with it set, identical runs produce identical
+    # outputs, so the response cache and provider prompt cache hit across runs.
+    seed: int | None = None
 
 
+@functools.cache
 def load_settings() -> Settings:
-    # Load once at import time so CLI tools “just work”
-    load_dotenv(override=True)
-
+    # Settings are frozen and derived purely from the environment, so the
+    # first result is cached for the life of the process.
     api_key = os.getenv("OPENAI_API_KEY", "")
     if not api_key:
         raise RuntimeError("Missing OPENAI_API_KEY. Create .env from .env.example and fill it in.")
@@ -27,10 +71,22 @@ def load_settings() -> Settings:
         model_default=os.getenv("OPENAI_DEFAULT_MODEL", "gpt-4.1"),
         model_fast=os.getenv("OPENAI_FAST_MODEL", "gpt-4.1-mini"),
         model_tiny=os.getenv("OPENAI_TINY_MODEL", "gpt-4.1-nano"),
+        skip_second_pass_for_simple_math=(
+            os.getenv("AGENT_SKIP_SECOND_PASS", "0").lower() in ("1", "true", "yes")
+        ),
+        max_answer_tokens=int(os.getenv("AGENT_MAX_ANSWER_TOKENS", "512")),
+        seed=int(seed_env) if (seed_env := os.getenv("OPENAI_SEED", "")) else None,
     )
 
 
 def make_client(settings: Settings) -> OpenAI:
     # The official SDK picks up the key from env automatically,
     # but we construct and return a client explicitly for clarity.
-    return OpenAI(api_key=settings.api_key)
+    # All clients share one keep-alive pool so repeat calls skip the handshake.
+    return OpenAI(api_key=settings.api_key, http_client=_shared_http_client())
+
+
+def make_async_client(settings: Settings) -> AsyncOpenAI:
+    # Async twin of make_client(), sharing its own process-wide pool so
+    # concurrent requests multiplex over warm connections.
+    return AsyncOpenAI(api_key=settings.api_key, http_client=_shared_async_http_client())
@@ -1,25 +1,54 @@
 from __future__ import annotations
 
+import argparse
+import asyncio
+
 from rich import print as rprint  # optional; remove if you don't want rich formatting
 
-from src.config import load_settings, make_client
+from src.config import load_settings, make_async_client
 from src.agent.core import Agent
 
-def main() -> None:
+async def main(k: int = 1) -> None:
     settings = load_settings()
-    client = make_client(settings)
+    client = make_async_client(settings)
     agent = Agent(client, settings)
 
     rprint("[bold cyan]Phase 1: Propose a challenging question[/bold cyan]")
-    q = agent.propose_question()
-    rprint(f"[yellow]Question:[/yellow] {q}")
-
-    rprint("\n[bold cyan]Phase 2: Solve with tools if needed[/bold cyan]")
-    ans = agent.solve(q)
-    rprint(f"[green]Answer:[/green] {ans}")
+    # Warm up the connection pool (TCP+TLS) in parallel with the first real call
+    warmup = asyncio.create_task(client.models.retrieve(settings.model_tiny))
+
+    if k > 1:
+        questions = await agent.propose_questions(k)
+        for i, q in enumerate(questions, 1):
+            rprint(f"[yellow]Question {i}:[/yellow] {q}")
+        try:
+            await warmup
+        except Exception:
+            pass  # warmup is best-effort; the demo works without it
+
+        rprint("\n[bold cyan]Phase 2: Solve with tools if needed[/bold cyan]")
+        answers = await agent.solve_many(questions)
+        for i, ans in enumerate(answers, 1):
+            rprint(f"[green]Answer {i}:[/green] {ans}")
+    else:
+        q = await agent.propose_question()
+        rprint(f"[yellow]Question:[/yellow] {q}")
+        try:
+            await warmup
+        except Exception:
+            pass  # warmup is best-effort; the demo works without it
+
+        rprint("\n[bold cyan]Phase 2: Solve with tools if needed[/bold cyan]")
+        rprint("[green]Answer:[/green] ", end="")
+        # Stream tokens as they arrive so the answer appears immediately
+        await agent.solve(q, on_delta=lambda tok: print(tok, end="", flush=True))
+        print()
 
     rprint("\n[dim]Done.[/dim]")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Run the agent demo.")
+    parser.add_argument("--k", type=int, default=1, help="number of questions to propose and solve")
+    args = parser.parse_args()
+    asyncio.run(main(args.k))